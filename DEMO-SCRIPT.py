@@ -113,7 +113,7 @@ def run_demo():
     print(f" EXPORTING RESULTS")
     print("="*40)
     
-    results_df = engine.export_results(segments, "demo_cart_abandoner_segments")
+    results = engine.export_results(segments, "demo_cart_abandoner_segments")
     print(f" Exported to CSV and JSON formats")
     print(f" Ready for marketing automation integration")
     
@@ -158,19 +158,31 @@ def validation_deep_dive(engine, segments, universe_df):
     
     # MECE mathematical validation
     print(f"\n2. MECE Mathematical Proof:")
-    user_segment_map = {}
+    # Scored segments carry no masks; derive them from the engine's per-user
+    # segment labels (engine.assignment, aligned with universe_df rows)
+    labels = engine.assignment
     
-    for i, segment in enumerate(segments):
-        segment_users = set(universe_df[segment['mask']]['user_id'])
+    # Segment index per user, -1 until assigned
+    assignment = np.full(len(universe_df), -1, dtype=np.int16)
+    
+    for label in np.unique(labels[labels >= 0]):
+        segment_mask = labels == label
         
         # Check for overlaps with previous segments
-        for user_id in segment_users:
-            if user_id in user_segment_map:
-                print(f"    OVERLAP DETECTED: User {user_id} in multiple segments")
-                return False
-            user_segment_map[user_id] = segment['segment_name']
+        overlap = segment_mask & (assignment != -1)
+        if overlap.any():
+            user_id = universe_df['user_id'].iloc[np.flatnonzero(overlap)[0]]
+            print(f"    OVERLAP DETECTED: User {user_id} in multiple segments")
+            return False
+        assignment[segment_mask] = label
+    
+    # Check the labelled users agree with the reported segment sizes
+    label_sizes = np.bincount(assignment[assignment != -1])
+    if sorted(label_sizes[label_sizes > 0]) != sorted(s['size'] for s in segments):
+        print(f"    SIZE MISMATCH: segment labels disagree with reported sizes")
+        return False
     
-    total_assigned = len(user_segment_map)
+    total_assigned = int(np.count_nonzero(assignment != -1))
     total_universe = len(universe_df)
     
     if total_assigned == total_universe: